@@ -105,10 +105,13 @@ parameter USE_PWCONV_OPT = 0;       // 1=启用PWConv优化（暂未实现）
 # ========== 工具函数 ==========
 
 def backup_file(filepath):
-    """备份文件"""
+    """备份文件（同一文件系统上用硬链接，不复制数据；失败时退回复制）"""
     if os.path.exists(filepath):
         backup_path = filepath + BACKUP_SUFFIX
-        shutil.copy2(filepath, backup_path)
+        try:
+            os.link(filepath, backup_path)
+        except (OSError, NotImplementedError):
+            shutil.copy2(filepath, backup_path)
         print(f"  ✓ 备份: {os.path.basename(filepath)} → {os.path.basename(backup_path)}")
         return backup_path
     else:
@@ -116,6 +119,20 @@ def backup_file(filepath):
         return None
 
 
+def detach_backup(backup_path):
+    """
+    未写入新内容时，把硬链接备份换成独立副本
+
+    硬链接备份只有在 write_file 替换原文件后才与原文件分离；否则之后任何原地写入
+    （r07 重新生成 Verilog、编辑器或 Quartus 保存）都会连同备份一起修改
+    """
+    if backup_path is None or os.stat(backup_path).st_nlink < 2:
+        return
+    tmp_path = backup_path + ".tmp"
+    shutil.copy2(backup_path, tmp_path)
+    os.replace(tmp_path, backup_path)
+
+
 def read_file(filepath):
     """读取文件内容"""
     try:
@@ -127,36 +144,47 @@ def read_file(filepath):
 
 
 def write_file(filepath, content):
-    """写入文件"""
+    """
+    写入文件
+
+    先写临时文件再替换原文件，而不是原地覆盖：备份可能是指向同一数据的硬链接，
+    原地写入会连同备份一起修改
+    """
+    tmp_path = filepath + ".tmp"
     try:
-        with open(filepath, 'w', encoding='utf-8') as f:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
             f.write(content)
+        if os.path.exists(filepath):
+            shutil.copymode(filepath, tmp_path)
+        os.replace(tmp_path, filepath)
         return True
     except Exception as e:
         print(f"  ✗ 写入失败: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
         return False
 
 
 def insert_code(content, search_pattern, insert_code, insert_type="after"):
-    """在指定位置插入代码"""
-    if search_pattern not in content:
+    """在指定位置插入代码（仅在第一次匹配处插入一次）"""
+    if insert_type not in ("after", "before"):
+        return content, False
+
+    # 一次扫描同时完成查找与切分
+    before, sep, after = content.partition(search_pattern)
+    if not sep:
         print(f"  ⚠ 未找到搜索模式: {search_pattern[:50]}...")
         return content, False
 
     if insert_type == "after":
         # 在匹配行之后插入
-        modified = content.replace(search_pattern, search_pattern + insert_code)
-    elif insert_type == "before":
-        # 在匹配行之前插入
-        modified = content.replace(search_pattern, insert_code + search_pattern)
+        modified = before + sep + insert_code + after
     else:
-        return content, False
+        # 在匹配行之前插入
+        modified = before + insert_code + sep + after
 
-    if modified != content:
-        print(f"  ✓ 已插入代码（{insert_type} \"{search_pattern[:30]}...\")")
-        return modified, True
-    else:
-        return content, False
+    print(f"  ✓ 已插入代码（{insert_type} \"{search_pattern[:30]}...\")")
+    return modified, True
 
 
 # ========== 主流程 ==========
@@ -185,6 +213,7 @@ def main():
         print("-" * 80)
 
         # 备份
+        backup_path = None
         if config.get("backup", False):
             backup_path = backup_file(filepath)
             if not backup_path:
@@ -193,6 +222,7 @@ def main():
         # 读取
         content = read_file(filepath)
         if not content:
+            detach_backup(backup_path)
             continue
 
         # 应用修改
@@ -212,8 +242,10 @@ def main():
                 modification_applied = modification_applied or success
 
         # 写入
+        written = False
         if modification_applied:
-            if write_file(filepath, modified_content):
+            written = write_file(filepath, modified_content)
+            if written:
                 print(f"  ✓ 文件已更新: {filename}")
                 success_count += 1
             else:
@@ -221,6 +253,9 @@ def main():
         else:
             print(f"  ⚠ 无修改应用: {filename}")
 
+        if not written:
+            detach_backup(backup_path)
+
         print()
 
     # 总结
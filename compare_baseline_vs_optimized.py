@@ -24,20 +24,61 @@ import re
 import json
 import time
 import subprocess
+import numpy as np
 from datetime import datetime
+from pathlib import Path
 from collections import defaultdict
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+
+# mmap 在部分 Python 构建中不可用，此时逐行解析 Quartus 报告
+try:
+    import mmap
+except ImportError:
+    mmap = None
+
+# 可选：orjson 解析 / 序列化大型结果文件更快，未安装时退回标准库 json
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    orjson = None
+    _json_loads = json.loads
 
 # ========== 配置 ==========
 BASELINE_DIR = "baseline_results"
 OPTIMIZED_DIR = "optimized_results"
 VERILOG_DIR = "verilog/MobileNet_v3_conv_8_3x1"
 
+# 测试结果文件
+BASELINE_PERF = Path(BASELINE_DIR) / "performance.json"
+OPTIMIZED_PERF = Path(OPTIMIZED_DIR) / "performance.json"
+BASELINE_OUTPUT = Path(BASELINE_DIR) / "inference_output.json"
+OPTIMIZED_OUTPUT = Path(OPTIMIZED_DIR) / "inference_output.json"
+
 # Quartus 报告文件（如果存在）
 QUARTUS_REPORTS = {
     "baseline": "output_files/baseline.fit.summary",
     "optimized": "output_files/optimized.fit.summary"
 }
 
+# Quartus 报告字段（模块加载时预编译，bytes 模式配合 mmap 使用）
+_RE_LE = re.compile(rb'Total logic elements\s*:\s*([\d,]+)\s*/\s*([\d,]+)\s*\(\s*([\d.]+)\s*%\s*\)')
+_RE_BRAM = re.compile(rb'Total block memory bits\s*:\s*([\d,]+)\s*/\s*([\d,]+)\s*\(\s*([\d.]+)\s*%\s*\)')
+_RE_FMAX = re.compile(rb'Fmax\s*:\s*([\d.]+)\s*MHz')
+_RE_POWER = re.compile(rb'Total thermal power dissipation\s*:\s*([\d.]+)\s*mW')
+
+# (字段, 行内标记, 正则)：逐行解析时先用廉价的子串判断过滤无关行
+_REPORT_FIELDS = (
+    ("le", b'Total logic elements', _RE_LE),
+    ("bram", b'Total block memory bits', _RE_BRAM),
+    ("fmax", b'Fmax', _RE_FMAX),
+    ("power", b'Total thermal power dissipation', _RE_POWER),
+)
+
+# 上述字段都位于报告开头的摘要部分，优先只搜索这一窗口
+REPORT_HEAD_BYTES = 65536
+
 # ========== 颜色输出 ==========
 class Colors:
     HEADER = '\033[95m'
@@ -57,12 +98,55 @@ def print_color(text, color=Colors.OKGREEN):
 # 1. 编译结果对比（从 Quartus 报告提取）
 # ========================================================================
 
+def _search_head_first(pattern, head, content):
+    """先在报告开头窗口 head 中搜索，未命中且文件更长时才回退到全文搜索"""
+    match = pattern.search(head)
+    if match is None and len(content) > len(head):
+        match = pattern.search(content)
+    return match
+
+
+def _search_report_mmap(f):
+    """以只读 mmap 方式映射报告，直接在字节上匹配：不解码、不复制整个文件"""
+    groups = {}
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as content:
+        head = content[:REPORT_HEAD_BYTES]
+        for key, _, pattern in _REPORT_FIELDS:
+            match = _search_head_first(pattern, head, content)
+            if match:
+                groups[key] = match.groups()
+    return groups
+
+
+def _search_report_lines(f):
+    """逐行扫描报告（无 mmap 时使用），所有字段找到后立即停止"""
+    groups = {}
+    for line in f:
+        for key, marker, pattern in _REPORT_FIELDS:
+            if key not in groups and marker in line:
+                match = pattern.search(line)
+                if match:
+                    groups[key] = match.groups()
+        if len(groups) == len(_REPORT_FIELDS):
+            break
+    return groups
+
+
 def parse_quartus_report(report_path):
     """解析 Quartus 综合报告"""
-    if not os.path.exists(report_path):
+    try:
+        mtime_ns = os.stat(report_path).st_mtime_ns
+    except FileNotFoundError:
         print(f"  ⚠ 报告不存在: {report_path}")
         return None
 
+    # 返回副本，调用方修改结果不会污染缓存
+    return dict(_parse_quartus_report_cached(report_path, mtime_ns))
+
+
+@lru_cache(maxsize=64)
+def _parse_quartus_report_cached(report_path, mtime_ns):
+    """按 (路径, 修改时间) 缓存解析结果：多次对比同一份报告只解析一次，报告更新后自动失效"""
     results = {
         "le_used": 0,
         "le_total": 0,
@@ -74,32 +158,36 @@ def parse_quartus_report(report_path):
         "power": 0.0
     }
 
-    with open(report_path, 'r', encoding='utf-8', errors='ignore') as f:
-        content = f.read()
-
-        # 提取逻辑单元（LE / ALM）
-        le_match = re.search(r'Total logic elements\s*:\s*([\d,]+)\s*/\s*([\d,]+)\s*\(\s*([\d.]+)\s*%\s*\)', content)
-        if le_match:
-            results["le_used"] = int(le_match.group(1).replace(',', ''))
-            results["le_total"] = int(le_match.group(2).replace(',', ''))
-            results["le_percent"] = float(le_match.group(3))
-
-        # 提取 BRAM
-        bram_match = re.search(r'Total block memory bits\s*:\s*([\d,]+)\s*/\s*([\d,]+)\s*\(\s*([\d.]+)\s*%\s*\)', content)
-        if bram_match:
-            results["bram_used"] = int(bram_match.group(1).replace(',', ''))
-            results["bram_total"] = int(bram_match.group(2).replace(',', ''))
-            results["bram_percent"] = float(bram_match.group(3))
-
-        # 提取 Fmax
-        fmax_match = re.search(r'Fmax\s*:\s*([\d.]+)\s*MHz', content)
-        if fmax_match:
-            results["fmax"] = float(fmax_match.group(1))
-
-        # 提取功耗
-        power_match = re.search(r'Total thermal power dissipation\s*:\s*([\d.]+)\s*mW', content)
-        if power_match:
-            results["power"] = float(power_match.group(1))
+    with open(report_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return results
+
+        if mmap is not None:
+            groups = _search_report_mmap(f)
+        else:
+            groups = _search_report_lines(f)
+
+    # 提取逻辑单元（LE / ALM）
+    if groups.get("le"):
+        used, total, percent = (g.decode('ascii') for g in groups["le"])
+        results["le_used"] = int(used.replace(',', ''))
+        results["le_total"] = int(total.replace(',', ''))
+        results["le_percent"] = float(percent)
+
+    # 提取 BRAM
+    if groups.get("bram"):
+        used, total, percent = (g.decode('ascii') for g in groups["bram"])
+        results["bram_used"] = int(used.replace(',', ''))
+        results["bram_total"] = int(total.replace(',', ''))
+        results["bram_percent"] = float(percent)
+
+    # 提取 Fmax
+    if groups.get("fmax"):
+        results["fmax"] = float(groups["fmax"][0].decode('ascii'))
+
+    # 提取功耗
+    if groups.get("power"):
+        results["power"] = float(groups["power"][0].decode('ascii'))
 
     return results
 
@@ -110,8 +198,12 @@ def compare_compilation_results():
     print_color("1. 编译结果对比（资源使用 & 时序）", Colors.HEADER)
     print_color("="*80, Colors.HEADER)
 
-    baseline = parse_quartus_report(QUARTUS_REPORTS["baseline"])
-    optimized = parse_quartus_report(QUARTUS_REPORTS["optimized"])
+    # 两份报告并行解析，重叠两次磁盘读取
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        baseline, optimized = executor.map(
+            parse_quartus_report,
+            [QUARTUS_REPORTS["baseline"], QUARTUS_REPORTS["optimized"]]
+        )
 
     if baseline is None and optimized is None:
         print_color("  ⚠ 未找到 Quartus 报告，跳过编译对比", Colors.WARNING)
@@ -123,30 +215,36 @@ def compare_compilation_results():
     print("-" * 80)
 
     if baseline and optimized:
+        # 各指标 [baseline, optimized] 堆叠为矩阵，一次算出全部差值与百分比（基准为 0 时记 0）
+        metrics = np.array([
+            [baseline["le_used"], optimized["le_used"]],
+            [baseline["bram_used"], optimized["bram_used"]],
+            [baseline["fmax"], optimized["fmax"]],
+            [baseline["power"], optimized["power"]],
+        ], dtype=np.float64)
+        delta = metrics[:, 1] - metrics[:, 0]
+        delta_percent = np.divide(delta, metrics[:, 0], out=np.zeros_like(delta),
+                                  where=metrics[:, 0] != 0) * 100
+        le_delta, bram_delta, fmax_delta, power_delta = delta
+        le_delta_percent, bram_delta_percent, _, power_delta_percent = delta_percent
+
         # 逻辑单元
-        le_delta = optimized["le_used"] - baseline["le_used"]
-        le_delta_percent = (le_delta / baseline["le_used"]) * 100 if baseline["le_used"] > 0 else 0
         print(f"{'逻辑单元 (LE)':<20} {baseline['le_used']:>15,} ({baseline['le_percent']:>5.1f}%)  "
               f"{optimized['le_used']:>15,} ({optimized['le_percent']:>5.1f}%)  "
-              f"{le_delta:>+10,} ({le_delta_percent:>+6.1f}%)")
+              f"{int(le_delta):>+10,} ({le_delta_percent:>+6.1f}%)")
 
         # BRAM
-        bram_delta = optimized["bram_used"] - baseline["bram_used"]
-        bram_delta_percent = (bram_delta / baseline["bram_used"]) * 100 if baseline["bram_used"] > 0 else 0
         print(f"{'BRAM (bits)':<20} {baseline['bram_used']:>15,} ({baseline['bram_percent']:>5.1f}%)  "
               f"{optimized['bram_used']:>15,} ({optimized['bram_percent']:>5.1f}%)  "
-              f"{bram_delta:>+10,} ({bram_delta_percent:>+6.1f}%)")
+              f"{int(bram_delta):>+10,} ({bram_delta_percent:>+6.1f}%)")
 
         # Fmax
-        fmax_delta = optimized["fmax"] - baseline["fmax"]
         fmax_color = Colors.OKGREEN if fmax_delta >= 0 else Colors.FAIL
         print(f"{'Fmax (MHz)':<20} {baseline['fmax']:>20.2f}  {optimized['fmax']:>20.2f}  ", end="")
         print_color(f"{fmax_delta:>+10.2f}", fmax_color)
 
         # 功耗
         if baseline["power"] > 0 and optimized["power"] > 0:
-            power_delta = optimized["power"] - baseline["power"]
-            power_delta_percent = (power_delta / baseline["power"]) * 100
             print(f"{'功耗 (mW)':<20} {baseline['power']:>20.1f}  {optimized['power']:>20.1f}  "
                   f"{power_delta:>+10.1f} ({power_delta_percent:>+6.1f}%)")
 
@@ -157,6 +255,17 @@ def compare_compilation_results():
 # 2. 功能正确性验证（输出一致性检查）
 # ========================================================================
 
+def load_result_pair(baseline_path, optimized_path):
+    """加载 baseline / optimized 结果 JSON，任一文件不存在时返回 None"""
+    try:
+        baseline = _json_loads(baseline_path.read_bytes())
+        optimized = _json_loads(optimized_path.read_bytes())
+    except FileNotFoundError:
+        return None
+
+    return baseline, optimized
+
+
 def test_functional_correctness():
     """测试功能正确性（需要实际 FPGA 或仿真）"""
     print_color("\n" + "="*80, Colors.HEADER)
@@ -171,32 +280,26 @@ def test_functional_correctness():
     print()
 
     # 检查是否存在测试结果
-    baseline_output = "baseline_results/inference_output.json"
-    optimized_output = "optimized_results/inference_output.json"
+    loaded = load_result_pair(BASELINE_OUTPUT, OPTIMIZED_OUTPUT)
 
-    if os.path.exists(baseline_output) and os.path.exists(optimized_output):
+    if loaded is not None:
         print("  ✓ 发现测试结果，开始对比...")
+        baseline_data, optimized_data = loaded
 
-        with open(baseline_output, 'r') as f:
-            baseline_data = json.load(f)
-        with open(optimized_output, 'r') as f:
-            optimized_data = json.load(f)
+        # 对比分类结果（一次性转为 NumPy 数组，向量化比较）
+        b_preds = baseline_data.get("predictions", [])
+        o_preds = optimized_data.get("predictions", [])
+        total_images = len(b_preds)
+        n = min(len(b_preds), len(o_preds))
 
-        # 对比分类结果
-        total_images = len(baseline_data.get("predictions", []))
-        matches = 0
-        max_diff = 0.0
+        b_cls = np.fromiter((p["class"] for p in b_preds[:n]), dtype=np.int32, count=n)
+        o_cls = np.fromiter((p["class"] for p in o_preds[:n]), dtype=np.int32, count=n)
+        b_prob = np.fromiter((p["probability"] for p in b_preds[:n]), dtype=np.float32, count=n)
+        o_prob = np.fromiter((p["probability"] for p in o_preds[:n]), dtype=np.float32, count=n)
 
-        for i, (b_pred, o_pred) in enumerate(zip(
-            baseline_data.get("predictions", []),
-            optimized_data.get("predictions", [])
-        )):
-            if b_pred["class"] == o_pred["class"]:
-                matches += 1
-
-            # 计算概率差异
-            diff = abs(b_pred["probability"] - o_pred["probability"])
-            max_diff = max(max_diff, diff)
+        matches = int((b_cls == o_cls).sum())
+        # 计算概率差异
+        max_diff = float(np.abs(b_prob - o_prob).max()) if n > 0 else 0.0
 
         accuracy = (matches / total_images) * 100 if total_images > 0 else 0
 
@@ -215,8 +318,8 @@ def test_functional_correctness():
 
     else:
         print_color("  ⚠ 未找到测试结果文件", Colors.WARNING)
-        print(f"    请创建: {baseline_output}")
-        print(f"    请创建: {optimized_output}")
+        print(f"    请创建: {BASELINE_OUTPUT}")
+        print(f"    请创建: {OPTIMIZED_OUTPUT}")
         print("\n  格式示例：")
         print('    {"predictions": [{"image": "test1.jpg", "class": 2, "probability": 0.95}, ...]}')
         return None
@@ -233,14 +336,10 @@ def compare_performance():
     print_color("="*80, Colors.HEADER)
 
     # 检查性能测试结果
-    baseline_perf = "baseline_results/performance.json"
-    optimized_perf = "optimized_results/performance.json"
+    loaded = load_result_pair(BASELINE_PERF, OPTIMIZED_PERF)
 
-    if os.path.exists(baseline_perf) and os.path.exists(optimized_perf):
-        with open(baseline_perf, 'r') as f:
-            baseline = json.load(f)
-        with open(optimized_perf, 'r') as f:
-            optimized = json.load(f)
+    if loaded is not None:
+        baseline, optimized = loaded
 
         # 打印对比
         print(f"\n{'指标':<30} {'Baseline':<20} {'Optimized':<20} {'加速比':<15}")
@@ -288,8 +387,8 @@ def compare_performance():
 
     else:
         print_color("  ⚠ 未找到性能测试结果", Colors.WARNING)
-        print(f"    请创建: {baseline_perf}")
-        print(f"    请创建: {optimized_perf}")
+        print(f"    请创建: {BASELINE_PERF}")
+        print(f"    请创建: {OPTIMIZED_PERF}")
         print("\n  提示：运行 benchmark_performance.py 生成性能数据")
         return None
 
@@ -298,6 +397,20 @@ def compare_performance():
 # 4. 生成对比报告
 # ========================================================================
 
+def _json_default(obj):
+    """标准库 json 的兜底：NumPy 标量 / 数组转为 Python 对象（与 orjson 的 OPT_SERIALIZE_NUMPY 一致）"""
+    if isinstance(obj, (np.generic, np.ndarray)):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dump_json_bytes(data):
+    """序列化为带 2 空格缩进的 UTF-8 JSON（benchmark_performance 也使用本函数）"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(data, indent=2, default=_json_default).encode('utf-8')
+
+
 def generate_report(compilation_data, functional_data, performance_data):
     """生成 Markdown 和 HTML 报告"""
     print_color("\n" + "="*80, Colors.HEADER)
@@ -397,8 +510,7 @@ def generate_report(compilation_data, functional_data, performance_data):
         "performance": performance_data
     }
 
-    with open("comparison_data.json", 'w', encoding='utf-8') as f:
-        json.dump(json_data, f, indent=2)
+    Path("comparison_data.json").write_bytes(dump_json_bytes(json_data))
 
     print("  ✓ JSON 数据已保存: comparison_data.json")
 
@@ -38,6 +38,9 @@ REPLACEMENTS = {
     '🐛': '[BUG]',
 }
 
+# 所有替换合并为一个正则，单次扫描完成；长键优先，保证 '⚠️' 先于 '⚠' 匹配
+_PATTERN = re.compile('|'.join(re.escape(k) for k in sorted(REPLACEMENTS, key=len, reverse=True)))
+
 def fix_file_encoding(filepath):
     """修复单个文件的编码"""
     if not filepath.endswith('.py'):
@@ -52,8 +55,7 @@ def fix_file_encoding(filepath):
         original_content = content
 
         # 替换所有 Unicode 字符
-        for unicode_char, ascii_char in REPLACEMENTS.items():
-            content = content.replace(unicode_char, ascii_char)
+        content = _PATTERN.sub(lambda m: REPLACEMENTS[m.group(0)], content)
 
         # 如果有修改
         if content != original_content:
@@ -3,6 +3,14 @@
 import os
 import json
 import sys
+import numpy as np
+
+# 可选：orjson 解析数值密集的大型 JSON 更快，未安装时退回标准库 json
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
 
 def print_banner():
@@ -16,8 +24,8 @@ def load_json_safe(filepath):
     if not os.path.exists(filepath):
         return None
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        with open(filepath, 'rb') as f:
+            return _json_loads(f.read())
     except:
         return None
 
@@ -84,24 +92,24 @@ def compare_layers():
     print("🔍 各层优化效果（Top 5）")
     print("-" * 70)
 
-    # 找出改进最大的层
-    improvements = []
-    for layer_name in baseline["layer_latency"].keys():
-        if layer_name in optimized["layer_latency"]:
-            b_lat = baseline["layer_latency"][layer_name]
-            o_lat = optimized["layer_latency"][layer_name]
-            improvement = (1 - o_lat / b_lat) * 100 if b_lat > 0 else 0
-            improvements.append((layer_name, b_lat, o_lat, improvement))
+    # 找出改进最大的层（两边都有的层，一次向量化计算改进幅度）
+    b_layers = baseline["layer_latency"]
+    o_layers = optimized["layer_latency"]
+    names = [name for name in b_layers if name in o_layers]
+    b = np.fromiter((b_layers[name] for name in names), dtype=np.float64, count=len(names))
+    o = np.fromiter((o_layers[name] for name in names), dtype=np.float64, count=len(names))
+    improvement = (1 - np.divide(o, b, out=np.ones_like(b), where=b > 0)) * 100
 
     # 按改进幅度排序
-    improvements.sort(key=lambda x: x[3], reverse=True)
+    top = np.argsort(-improvement, kind='stable')[:5]
 
     print(f"{'层名':<30} {'Baseline (ms)':<15} {'Optimized (ms)':<15} {'改进':<10}")
     print("-" * 70)
 
-    for layer_name, b_lat, o_lat, improvement in improvements[:5]:
-        emoji = "🚀" if improvement > 50 else ("⬆️ " if improvement > 20 else "➡️ ")
-        print(f"{layer_name:<30} {b_lat:>10.2f}  {o_lat:>15.2f}  {emoji} {improvement:>6.1f}%")
+    for i in top:
+        layer_name, b_lat, o_lat = names[i], b[i], o[i]
+        emoji = "🚀" if improvement[i] > 50 else ("⬆️ " if improvement[i] > 20 else "➡️ ")
+        print(f"{layer_name:<30} {b_lat:>10.2f}  {o_lat:>15.2f}  {emoji} {improvement[i]:>6.1f}%")
 
     print()
 
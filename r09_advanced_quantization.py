@@ -16,11 +16,15 @@ Advanced Quantization Optimization for MobileNet FPGA
 """
 
 import os
+import json
+import math
 import numpy as np
 import pickle
-from sklearn.cluster import KMeans
+import shelve
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from collections import defaultdict
-import matplotlib.pyplot as plt
 
 # 复用现有的工具函数
 from a00_common_functions import *
@@ -33,19 +37,72 @@ from a00_common_functions import *
 class LayerSensitivityAnalyzer:
     """分析每层对量化的敏感度，确定最优比特宽度"""
 
-    def __init__(self, model, test_images, test_labels):
+    def __init__(self, model, test_images, test_labels, cache_path=None):
         """
         参数：
             model: Keras 模型
             test_images: 测试图像数据
             test_labels: 测试标签
+            cache_path: 可选的磁盘缓存文件（shelve）。以 (层名, 整个模型权重与测试数据的哈希,
+                比特数) 为键缓存精度：某层的精度取决于整个网络，因此只有模型和数据都未改变的
+                重复运行才会命中缓存。使用完毕后调用 close()，或以 with 语句使用本对象
         """
         self.model = model
         self.test_images = test_images
         self.test_labels = test_labels
+        # 真实标签与预测批大小只算一次，敏感度扫描中每次评估直接复用
+        self._true_labels = np.argmax(test_labels, axis=1)
+        self._predict_batch = min(len(test_images), 512)
+        self._predict_fn = None  # 首次评估时才构建，见 _compiled_predictions
+        self._predict_fn_built = False
         self.layer_names = [layer.name for layer in model.layers if 'conv' in layer.name]
         self.sensitivity_map = {}
 
+        self._cache = shelve.open(cache_path) if cache_path else None
+        if self._cache is not None:
+            # 全部模型权重与测试数据都参与缓存键：任何一层被重新训练/折叠/缩放，
+            # 或换一批数据时，所有层的缓存都自动失效
+            hasher = hashlib.blake2b(digest_size=16)
+            for w in model.get_weights():
+                hasher.update(np.ascontiguousarray(w).tobytes())
+            hasher.update(np.ascontiguousarray(test_images).tobytes())
+            hasher.update(np.ascontiguousarray(test_labels).tobytes())
+            self._data_hash = hasher.hexdigest()
+
+    def close(self):
+        """关闭磁盘缓存"""
+        if self._cache is not None:
+            self._cache.close()
+            self._cache = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _weights_hash(self, weights):
+        """层权重（及整个模型权重、测试数据）的哈希，用作缓存键"""
+        hasher = hashlib.blake2b(self._data_hash.encode('ascii'), digest_size=16)
+        for w in weights:
+            hasher.update(np.ascontiguousarray(w).tobytes())
+        return hasher.hexdigest()
+
+    def _cache_prefix(self, layer_name, weights):
+        """该层在缓存中的键前缀（完整的键为 前缀:比特数）"""
+        return f"{layer_name}:{self._weights_hash(weights)}"
+
+    def _cached_layer_entries(self, layer_name, bit_range=(4, 16)):
+        """取出磁盘缓存中该层（当前权重）已有的全部结果，并行模式下随任务发给工作进程"""
+        weights = [v.numpy() for v in self.model.get_layer(layer_name).weights]
+        prefix = self._cache_prefix(layer_name, weights)
+        entries = {}
+        for bits in range(bit_range[0], bit_range[1] + 1):
+            key = f"{prefix}:{bits}"
+            if key in self._cache:
+                entries[key] = self._cache[key]
+        return entries
+
     def analyze_layer(self, layer_name, bit_range=(4, 16)):
         """
         分析单层的量化敏感度
@@ -56,36 +113,41 @@ class LayerSensitivityAnalyzer:
         """
         print(f"\n[*] 分析层: {layer_name}")
 
+        # 直接操作层的 tf.Variable：assign 复用已有的设备缓冲区，
+        # 跳过 set_weights 每次调用的列表整理与形状校验
         layer = self.model.get_layer(layer_name)
-        original_weights = layer.get_weights()
+        variables = layer.weights
+        original_weights = [v.numpy() for v in variables]
+        cache_prefix = None
+        if self._cache is not None:
+            cache_prefix = self._cache_prefix(layer_name, original_weights)
 
         sensitivity_curve = {}
 
-        for bits in range(bit_range[0], bit_range[1] + 1):
-            # 量化权重
-            quantized_weights = self._quantize_weights(original_weights, bits)
-
-            # 临时替换权重
-            layer.set_weights(quantized_weights)
-
-            # 评估精度
-            accuracy = self._evaluate_accuracy()
-            sensitivity_curve[bits] = accuracy
-
-            print(f"    {bits}-bit: Accuracy = {accuracy:.4f}")
+        # 以最高比特数的精度作为基准
+        accuracy_threshold = 0.99  # 99% 原始精度
+        baseline_accuracy = self._evaluate_bits(variables, original_weights, bit_range[1],
+                                                sensitivity_curve, cache_prefix)
+
+        # 精度随比特数单调不减：二分查找满足精度阈值的最小比特数，
+        # 只需 ceil(log2(N)) 次评估而不是逐个比特数评估
+        lo, hi = bit_range
+        while lo < hi:
+            mid = (lo + hi) // 2
+            accuracy = self._evaluate_bits(variables, original_weights, mid,
+                                          sensitivity_curve, cache_prefix)
+            if accuracy >= baseline_accuracy * accuracy_threshold:
+                hi = mid
+            else:
+                lo = mid + 1
+        optimal_bits = lo
 
         # 恢复原始权重
-        layer.set_weights(original_weights)
-
-        # 选择满足精度阈值的最小比特数
-        accuracy_threshold = 0.99  # 99% 原始精度
-        baseline_accuracy = sensitivity_curve[bit_range[1]]
-        optimal_bits = bit_range[1]
+        for v, w in zip(variables, original_weights):
+            v.assign(w)
 
-        for bits in range(bit_range[0], bit_range[1] + 1):
-            if sensitivity_curve[bits] >= baseline_accuracy * accuracy_threshold:
-                optimal_bits = bits
-                break
+        # 报告中只包含实际测量过的比特数
+        sensitivity_curve = dict(sorted(sensitivity_curve.items()))
 
         self.sensitivity_map[layer_name] = {
             'optimal_bits': optimal_bits,
@@ -95,43 +157,179 @@ class LayerSensitivityAnalyzer:
         print(f"    ✓ 最优比特数: {optimal_bits}")
         return optimal_bits, sensitivity_curve
 
-    def _quantize_weights(self, weights, bits):
-        """量化权重到指定比特数"""
-        quantized = []
+    def _evaluate_bits(self, variables, original_weights, bits, sensitivity_curve, cache_prefix=None):
+        """
+        评估该层量化到 bits 比特时的精度，结果记入 sensitivity_curve（已测过的直接返回）
+
+        cache_prefix 不为 None 时先查磁盘缓存，命中则跳过替换权重和预测
+        """
+        if bits in sensitivity_curve:
+            return sensitivity_curve[bits]
+
+        cache_key = f"{cache_prefix}:{bits}" if cache_prefix is not None else None
+        if cache_key is not None and cache_key in self._cache:
+            accuracy = self._cache[cache_key]
+            sensitivity_curve[bits] = accuracy
+            print(f"    {bits}-bit: Accuracy = {accuracy:.4f} (缓存)")
+            return accuracy
+
+        # 量化权重并临时替换
+        quantized_weights = self._quantize_weights(original_weights, [bits])[bits]
+        for v, q in zip(variables, quantized_weights):
+            v.assign(q)
+
+        # 评估精度
+        accuracy = self._evaluate_accuracy()
+        sensitivity_curve[bits] = accuracy
+        if cache_key is not None:
+            self._cache[cache_key] = accuracy
+
+        print(f"    {bits}-bit: Accuracy = {accuracy:.4f}")
+        return accuracy
+
+    def _quantize_weights(self, weights, bit_widths):
+        """
+        将权重量化到 bit_widths 中的每个比特数
+
+        返回：
+            {bits: 量化-反量化后的权重列表}
+        """
+        bit_widths = list(bit_widths)
+        quantized = {bits: [] for bits in bit_widths}
 
         for w in weights:
             if len(w.shape) == 0:  # 标量（偏置）
-                quantized.append(w)
+                for bits in bit_widths:
+                    quantized[bits].append(w)
                 continue
 
+            # min/max 每个张量只算一次，各比特数复用同一块临时缓冲区
             w_min, w_max = w.min(), w.max()
-            scale = (2 ** bits - 1) / (w_max - w_min + 1e-8)
+            buf = np.empty(w.shape, dtype=np.float32)
+
+            for bits in bit_widths:
+                scale = (2 ** bits - 1) / (w_max - w_min + 1e-8)
 
-            # 量化
-            w_quant = np.round((w - w_min) * scale).astype(np.int32)
+                # 量化
+                np.subtract(w, w_min, out=buf)
+                np.multiply(buf, scale, out=buf)
+                np.rint(buf, out=buf)
 
-            # 反量化
-            w_dequant = (w_quant / scale + w_min).astype(np.float32)
-            quantized.append(w_dequant)
+                # 反量化
+                w_dequant = np.empty(w.shape, dtype=np.float32)
+                np.multiply(buf, 1.0 / scale, out=w_dequant)
+                np.add(w_dequant, w_min, out=w_dequant)
+                quantized[bits].append(w_dequant)
 
         return quantized
 
+    def _build_predict_fn(self):
+        """
+        Keras 模型：测试集按 _predict_batch 切成常量张量批次（最后一批补零到同样大小），
+        构建一次固定输入形状、XLA 编译的前向函数，返回逐批预测并拼接结果的函数；
+        层权重通过 assign 修改，函数每次调用都会读取最新值，无需重新构建。
+        非 Keras 模型或未安装 tensorflow 时返回 None，退回 model.predict
+        """
+        try:
+            import tensorflow as tf
+            from tensorflow import keras
+        except ImportError:
+            return None
+
+        if not isinstance(self.model, keras.Model):
+            return None
+
+        num_images = len(self.test_images)
+        batch_size = self._predict_batch
+        batches = []
+        for i in range(0, num_images, batch_size):
+            batch = self.test_images[i:i + batch_size]
+            if len(batch) < batch_size:
+                pad = np.zeros((batch_size - len(batch), *batch.shape[1:]), dtype=batch.dtype)
+                batch = np.concatenate([batch, pad])
+            batches.append(tf.constant(batch))
+
+        model = self.model
+
+        @tf.function(input_signature=[tf.TensorSpec(batches[0].shape, batches[0].dtype)],
+                     jit_compile=True)
+        def _forward(x):
+            return model(x, training=False)
+
+        def _predict():
+            return np.concatenate([_forward(b).numpy() for b in batches])[:num_images]
+
+        return _predict
+
+    def _compiled_predictions(self):
+        """
+        用 XLA 编译的前向函数预测。首次调用时才构建：并行模式的主进程和全部命中缓存的运行
+        从不评估，也就不必多占一份测试集内存。不可用，或首次调用时 XLA 编译失败，返回 None
+        """
+        if not self._predict_fn_built:
+            self._predict_fn_built = True
+            self._predict_fn = self._build_predict_fn()
+            if self._predict_fn is None:
+                return None
+            try:
+                return self._predict_fn()
+            except Exception as e:
+                print(f"    [!] XLA 编译失败，退回 model.predict: {type(e).__name__}: {e}")
+                self._predict_fn = None
+                return None
+
+        if self._predict_fn is None:
+            return None
+        return self._predict_fn()
+
     def _evaluate_accuracy(self):
         """评估当前模型精度"""
-        predictions = self.model.predict(self.test_images)
+        predictions = self._compiled_predictions()
+        if predictions is None:
+            predictions = self.model.predict(self.test_images, batch_size=self._predict_batch, verbose=0)
         pred_labels = np.argmax(predictions, axis=1)
-        true_labels = np.argmax(self.test_labels, axis=1)
-        accuracy = np.mean(pred_labels == true_labels)
+        accuracy = np.mean(pred_labels == self._true_labels)
         return accuracy
 
-    def analyze_all_layers(self):
-        """分析所有卷积层"""
+    def analyze_all_layers(self, num_workers=1, custom_objects=None):
+        """
+        分析所有卷积层
+
+        参数：
+            num_workers: 并行进程数。各层的分析互相独立，num_workers > 1 时
+                每个进程从 JSON + 权重重建一份模型，分别分析分配到的层。
+                磁盘缓存只由主进程读写：已缓存的结果随任务发给工作进程，
+                工作进程新算出的结果返回后由主进程写入
+            custom_objects: 工作进程反序列化模型所需的自定义对象，
+                默认 {'relu_1': relu_1}（与 get_model 一致）
+        """
         print("=" * 60)
         print("开始逐层敏感度分析...")
         print("=" * 60)
 
-        for layer_name in self.layer_names:
-            self.analyze_layer(layer_name)
+        if num_workers <= 1:
+            for layer_name in self.layer_names:
+                self.analyze_layer(layer_name)
+            return self.sensitivity_map
+
+        if custom_objects is None:
+            custom_objects = {'relu_1': relu_1}
+        data_hash = self._data_hash if self._cache is not None else None
+        initargs = (self.model.to_json(), self.model.get_weights(),
+                    self.test_images, self.test_labels, custom_objects, data_hash)
+        if self._cache is not None:
+            tasks = [(name, self._cached_layer_entries(name)) for name in self.layer_names]
+        else:
+            tasks = [(name, None) for name in self.layer_names]
+
+        with ProcessPoolExecutor(max_workers=num_workers,
+                                 mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_sensitivity_worker,
+                                 initargs=initargs) as executor:
+            for layer_name, info, new_entries in executor.map(_analyze_layer_in_worker, tasks):
+                self.sensitivity_map[layer_name] = info
+                if self._cache is not None:
+                    self._cache.update(new_entries)
 
         return self.sensitivity_map
 
@@ -170,21 +368,100 @@ class LayerSensitivityAnalyzer:
         print(f"\n[✓] 报告已保存到: {output_path}")
 
 
+# 敏感度分析工作进程（analyze_all_layers(num_workers > 1) 使用）
+_worker_analyzer = None
+_worker_init_error = None
+
+
+def _init_sensitivity_worker(model_json, model_weights, test_images, test_labels, custom_objects,
+                             data_hash):
+    """在工作进程中重建模型；每个进程只用单线程，避免多进程时 CPU 超额订阅"""
+    global _worker_analyzer, _worker_init_error
+    try:
+        import tensorflow as tf
+
+        tf.config.threading.set_intra_op_parallelism_threads(1)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+
+        model = tf.keras.models.model_from_json(model_json, custom_objects=custom_objects)
+        model.set_weights(model_weights)
+        _worker_analyzer = LayerSensitivityAnalyzer(model, test_images, test_labels)
+        # 与主进程使用相同的缓存键；缓存本身按任务以内存 dict 传入
+        _worker_analyzer._data_hash = data_hash
+    except Exception as e:
+        # 初始化器抛出异常只会让主进程看到 BrokenProcessPool，
+        # 因此先记录错误，由首个任务抛出
+        _worker_init_error = f"{type(e).__name__}: {e}"
+
+
+def _analyze_layer_in_worker(task):
+    """task = (层名, 该层已缓存的结果 dict 或 None)；返回 (层名, 分析结果, 新算出的缓存项)"""
+    if _worker_init_error is not None:
+        raise RuntimeError(f"敏感度分析工作进程初始化失败: {_worker_init_error}")
+    layer_name, cached = task
+    _worker_analyzer._cache = dict(cached) if cached is not None else None
+    _worker_analyzer.analyze_layer(layer_name)
+
+    new_entries = {}
+    if cached is not None:
+        new_entries = {k: v for k, v in _worker_analyzer._cache.items() if k not in cached}
+    return layer_name, _worker_analyzer.sensitivity_map[layer_name], new_entries
+
+
 # ========================================================================
 # 2. 权重聚类量化（K-means）
 # ========================================================================
 
+def _histogram_kmeans(weights_flat, k, num_bins=4096, max_iter=100):
+    """
+    一维 K-means（Lloyd-Max）：在权重直方图的 bin 中心上迭代，
+    每次迭代的代价为 O(k + num_bins)，与权重数量无关
+
+    参数：
+        weights_flat: 一维权重数组
+        k: 聚类中心数量
+
+    返回：
+        centroids: 升序排列的聚类中心
+        labels: 每个权重所属聚类的索引
+    """
+    hist, edges = np.histogram(weights_flat, bins=num_bins)
+    centers = (edges[:-1] + edges[1:]) / 2
+    centroids = np.quantile(weights_flat, np.linspace(0, 1, k))
+
+    for _ in range(max_iter):
+        # 聚类中心有序时，相邻中心的中点即为分配边界
+        midpoints = (centroids[:-1] + centroids[1:]) / 2
+        assign = np.searchsorted(midpoints, centers)
+
+        # 每个聚类中心更新为所分配 bin 的加权平均（空聚类保持不变）
+        counts = np.bincount(assign, weights=hist, minlength=k)
+        sums = np.bincount(assign, weights=hist * centers, minlength=k)
+        new_centroids = np.sort(np.where(counts > 0, sums / np.maximum(counts, 1), centroids))
+
+        if np.allclose(new_centroids, centroids):
+            break
+        centroids = new_centroids
+
+    midpoints = (centroids[:-1] + centroids[1:]) / 2
+    labels = np.searchsorted(midpoints, weights_flat)
+    return centroids.astype(weights_flat.dtype), labels
+
+
 class WeightClusteringQuantizer:
     """使用 K-means 聚类量化权重，显著减少 PWConv 存储"""
 
-    def __init__(self, num_clusters=16):
+    def __init__(self, num_clusters=16, backend='histogram'):
         """
         参数：
             num_clusters: 聚类中心数量（16=4bit 索引，256=8bit 索引）
+            backend: 'histogram'（一维直方图 Lloyd-Max，默认）或 'sklearn'（MiniBatchKMeans）
         """
         self.num_clusters = num_clusters
+        self.backend = backend
         self.codebooks = {}
         self.indices = {}
+        self._dequantized = {}  # 层名称 -> 反量化权重缓存，重新量化该层时失效
 
     def quantize_layer_weights(self, weights, layer_name):
         """
@@ -201,13 +478,25 @@ class WeightClusteringQuantizer:
         print(f"\n[*] 聚类量化层: {layer_name}")
 
         original_shape = weights.shape
-        weights_flat = weights.flatten().reshape(-1, 1)
+        # 连续数组上 ravel 与 [:, None] 均为零拷贝视图（flatten 总会复制一份）
+        weights_1d = np.ascontiguousarray(weights).ravel()
+        weights_flat = weights_1d[:, None]
 
         # K-means 聚类
-        print(f"    执行 K-means (k={self.num_clusters})...")
-        kmeans = KMeans(n_clusters=self.num_clusters, random_state=42, n_init=10)
-        labels = kmeans.fit_predict(weights_flat)
-        centroids = kmeans.cluster_centers_.flatten()
+        print(f"    执行 K-means (k={self.num_clusters}, backend={self.backend})...")
+        if self.backend == 'histogram':
+            centroids, labels = _histogram_kmeans(weights_1d, self.num_clusters)
+        else:
+            # sklearn 仅在此后端使用，延迟导入以免拖慢模块加载
+            from sklearn.cluster import MiniBatchKMeans
+
+            # 一维数据按分位数初始化聚类中心已接近最优，
+            # 因此只需一次 MiniBatch 初始化，无需对每次 Lloyd 迭代遍历全部权重
+            init_centroids = np.quantile(weights_flat, np.linspace(0, 1, self.num_clusters)).reshape(-1, 1)
+            kmeans = MiniBatchKMeans(n_clusters=self.num_clusters, random_state=42, n_init=1,
+                                     batch_size=8192, init=init_centroids)
+            labels = kmeans.fit_predict(weights_flat)
+            centroids = kmeans.cluster_centers_.flatten()
 
         # 重塑回原始形状
         indices = labels.reshape(original_shape).astype(np.uint8 if self.num_clusters <= 256 else np.uint16)
@@ -216,6 +505,7 @@ class WeightClusteringQuantizer:
         # 保存
         self.codebooks[layer_name] = codebook
         self.indices[layer_name] = indices
+        self._dequantized.pop(layer_name, None)
 
         # 计算压缩率
         original_size = weights.size * 32  # 假设原始 32-bit float
@@ -230,28 +520,82 @@ class WeightClusteringQuantizer:
 
         return indices, codebook
 
+    def quantize_all_layers(self, layer_weights, n_jobs=1):
+        """
+        量化多层权重（各层聚类互相独立，可并行）
+
+        参数：
+            layer_weights: {层名称: 权重数组}
+            n_jobs: 并行进程数（-1 = 使用全部 CPU 核）。默认的 histogram 后端每层只需
+                毫秒级，启动进程池并序列化本对象的开销反而更大，因此默认串行；
+                层数多且使用 sklearn 后端时再开启并行
+
+        返回：
+            {层名称: (indices, codebook)}
+        """
+        if n_jobs == 1:
+            return {name: self.quantize_layer_weights(w, name) for name, w in layer_weights.items()}
+
+        # joblib 仅并行路径使用，延迟导入以免拖慢模块加载
+        from joblib import Parallel, delayed
+
+        layer_names = list(layer_weights)
+        results = Parallel(n_jobs=n_jobs, backend='loky')(
+            delayed(self.quantize_layer_weights)(layer_weights[name], name) for name in layer_names
+        )
+
+        # 工作进程中的结果不会回写到本对象，在此统一保存
+        for name, (indices, codebook) in zip(layer_names, results):
+            self.indices[name] = indices
+            self.codebooks[name] = codebook
+            self._dequantized.pop(name, None)
+
+        return dict(zip(layer_names, results))
+
     def dequantize_weights(self, indices, codebook):
-        """反量化：从索引恢复权重"""
-        return codebook[indices]
+        """反量化：从索引恢复权重（码本很小，np.take 查表比花式索引更快）"""
+        codebook = np.ascontiguousarray(codebook, dtype=np.float32)
+        indices = np.ascontiguousarray(indices)
+        return np.take(codebook, indices)
+
+    def dequantize_layer(self, layer_name):
+        """
+        反量化已量化的层，结果按层缓存，供敏感度扫描等场景重复使用
+
+        返回的是缓存数组本身且为只读，需要原地修改（如缩放后再 assign）时先 copy()
+        """
+        weights = self._dequantized.get(layer_name)
+        if weights is None:
+            weights = self.dequantize_weights(self.indices[layer_name], self.codebooks[layer_name])
+            weights.setflags(write=False)
+            self._dequantized[layer_name] = weights
+        return weights
 
     def save_to_fpga_format(self, output_dir='quantized_weights'):
         """保存为 FPGA 可用的格式"""
         os.makedirs(output_dir, exist_ok=True)
 
         for layer_name in self.codebooks.keys():
-            # 保存索引（二进制文件）
+            # 保存索引（二进制文件，保证连续内存后整块写出）
             indices_path = os.path.join(output_dir, f"{layer_name}_indices.bin")
-            self.indices[layer_name].tofile(indices_path)
+            np.ascontiguousarray(self.indices[layer_name]).tofile(indices_path)
+
+            # 码本一次性转换为定点数（假设 19-bit，10 位小数精度，向零截断）
+            codebook = self.codebooks[layer_name]
+            fixed_point = np.trunc(codebook * (2 ** 10)).astype(np.int32)
+
+            # 保存码本（int32 二进制文件，供 HDL 工具链直接读取）
+            codebook_bin_path = os.path.join(output_dir, f"{layer_name}_codebook.bin")
+            fixed_point.tofile(codebook_bin_path)
 
-            # 保存码本（文本文件，方便 Verilog 读取）
+            # 保存码本（文本文件，便于人工查看）
             codebook_path = os.path.join(output_dir, f"{layer_name}_codebook.txt")
             with open(codebook_path, 'w') as f:
-                for i, value in enumerate(self.codebooks[layer_name]):
-                    # 转换为定点数（假设 19-bit）
-                    fixed_point = int(value * (2 ** 10))  # 10 位小数精度
-                    f.write(f"{i:02d}: {fixed_point:020b}  // {value:.6f}\n")
+                f.write("".join(f"{i:02d}: {fixed:020b}  // {value:.6f}\n"
+                                for i, (fixed, value) in enumerate(zip(fixed_point.tolist(), codebook))))
 
             print(f"    [✓] 保存: {indices_path}")
+            print(f"    [✓] 保存: {codebook_bin_path}")
             print(f"    [✓] 保存: {codebook_path}")
 
 
@@ -259,27 +603,37 @@ class WeightClusteringQuantizer:
 # 3. 激活值对数量化
 # ========================================================================
 
-def logarithmic_quantize_activation(activation, out_bits=8):
+def logarithmic_quantize_activation(activation, out_bits=8, out=None):
     """
     对数量化激活值（减少动态范围）
 
     参数：
         activation: ReLU 后的激活值（非负）
         out_bits: 输出比特数
+        out: 可选的浮点临时缓冲区（与 activation 同形状），循环调用时由调用方复用
 
     返回：
         quantized: 量化后的激活值
     """
-    # ReLU（确保非负）
-    activation = np.maximum(activation, 0)
+    if out is None:
+        out = np.empty(activation.shape, dtype=np.result_type(activation, np.float32))
 
-    # 对数变换：log2(x + 1)
-    log_activation = np.log2(activation + 1)
+    # max(relu(x)) = max(0, max(x))：直接在原始激活值上归约，无需先得到 ReLU 结果
+    amax = max(0.0, float(activation.max()))
+    max_log = math.log2(amax + 1)
+
+    # ReLU（确保非负）+ 对数变换 log2(x + 1)，全部在同一缓冲区内完成
+    np.maximum(activation, 0, out=out)
+    np.add(out, 1, out=out)
+    np.log2(out, out=out)
 
     # 量化
-    max_log = np.log2(activation.max() + 1)
     scale = (2 ** out_bits - 1) / (max_log + 1e-8)
-    quantized = np.round(log_activation * scale).astype(np.uint8)
+    np.multiply(out, scale, out=out)
+
+    # 取整结果直接写入 uint8 数组，不再经过浮点临时结果 + astype 复制
+    quantized = np.empty(activation.shape, dtype=np.uint8)
+    np.rint(out, out=quantized, casting='unsafe')
 
     return quantized
 
@@ -296,6 +650,54 @@ def logarithmic_dequantize_activation(quantized, original_max, out_bits=8):
     return activation
 
 
+def exponent_quantize_activation(activation, out_bits=8, mantissa_bits=3):
+    """
+    对数量化激活值（指数 + 尾数编码，无超越函数）
+
+    x + 1 = m * 2**e（m ∈ [0.5, 1)）本身就是对数表示：np.frexp 直接取出浮点数的
+    指数和尾数，代替 np.log2；编码自包含，无需激活最大值
+
+    编码格式：
+        code = ((e - 1) << mantissa_bits) | mantissa_code
+        高 (out_bits - mantissa_bits) 位为指数，低 mantissa_bits 位为量化后的尾数
+
+    参数：
+        activation: ReLU 后的激活值（非负）
+        out_bits: 输出比特数
+        mantissa_bits: 尾数比特数
+
+    返回：
+        quantized: 量化后的激活值
+    """
+    m, e = np.frexp(np.maximum(activation, 0) + 1)
+
+    exp_max = (1 << (out_bits - mantissa_bits)) - 1
+    mant_max = (1 << mantissa_bits) - 1
+    dtype = np.uint8 if out_bits <= 8 else np.uint16
+
+    # x + 1 >= 1，因此 e >= 1；超出指数范围的值饱和到最大编码
+    exp = e - 1
+    overflow = exp > exp_max
+    exp_code = np.minimum(exp, exp_max).astype(dtype)
+    np.subtract(m, 0.5, out=m)
+    np.multiply(m, 2 * mant_max, out=m)
+    mant_code = np.empty(m.shape, dtype=dtype)
+    np.rint(m, out=mant_code, casting='unsafe')
+    mant_code[overflow] = mant_max
+
+    return (exp_code << mantissa_bits) | mant_code
+
+
+def exponent_dequantize_activation(quantized, mantissa_bits=3):
+    """反量化（exponent_quantize_activation 的逆变换，用 np.ldexp 代替 2 ** x）"""
+    mant_max = (1 << mantissa_bits) - 1
+
+    e = (quantized >> mantissa_bits).astype(np.int32) + 1
+    frac = (quantized & mant_max) / mant_max
+
+    return np.ldexp(0.5 + frac / 2, e) - 1
+
+
 # ========================================================================
 # 4. 混合精度配置生成
 # ========================================================================
@@ -304,6 +706,8 @@ def generate_mixed_precision_config(sensitivity_map, output_path='mixed_precisio
     """
     根据敏感度分析生成混合精度配置文件
 
+    同时生成同名 .json 文件（内容相同），供构建工具直接读取
+
     生成格式：
         LAYER_BIT_CONFIG = {
             'conv1_dw': {'weight': 8, 'activation': 8},
@@ -330,14 +734,17 @@ def generate_mixed_precision_config(sensitivity_map, output_path='mixed_precisio
 
     # 保存配置
     with open(output_path, 'w', encoding='utf-8') as f:
-        f.write("# MobileNet FPGA 混合精度配置\n")
-        f.write("# 自动生成，请勿手动编辑\n\n")
-        f.write("LAYER_BIT_CONFIG = {\n")
-        for layer_name, bits in config.items():
-            f.write(f"    '{layer_name}': {bits},\n")
-        f.write("}\n")
+        f.write("# MobileNet FPGA 混合精度配置\n"
+                "# 自动生成，请勿手动编辑\n\n"
+                "LAYER_BIT_CONFIG = " + repr(config) + "\n")
+
+    # 同时输出 JSON：构建工具可直接 json.load，无需执行 Python 文件
+    json_path = os.path.splitext(output_path)[0] + '.json'
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(config, f, separators=(',', ':'))
 
     print(f"\n[✓] 混合精度配置已保存到: {output_path}")
+    print(f"[✓] 混合精度配置（JSON）已保存到: {json_path}")
     return config
 
 
@@ -364,9 +771,10 @@ if __name__ == '__main__':
     print("=" * 80)
 
     # 取消注释以下代码以运行实际分析
-    # analyzer = LayerSensitivityAnalyzer(model, test_images, test_labels)
-    # sensitivity_map = analyzer.analyze_all_layers()
-    # analyzer.generate_report()
+    # with LayerSensitivityAnalyzer(model, test_images, test_labels,
+    #                               cache_path='sensitivity_cache') as analyzer:
+    #     sensitivity_map = analyzer.analyze_all_layers(num_workers=os.cpu_count())
+    #     analyzer.generate_report()
 
     # 示例输出（模拟）
     sensitivity_map = {
@@ -388,7 +796,7 @@ if __name__ == '__main__':
 
     # 示例：量化虚拟权重
     dummy_weights = np.random.randn(1, 1, 64, 8).astype(np.float32)  # 1×1 卷积
-    indices, codebook = quantizer.quantize_layer_weights(dummy_weights, 'conv1_pw')
+    quantizer.quantize_all_layers({'conv1_pw': dummy_weights})
 
     # 保存 FPGA 格式
     quantizer.save_to_fpga_format()
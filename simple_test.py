@@ -55,17 +55,17 @@ def test_performance(mode):
     print("  测试延迟...")
     latencies = []
     for i in range(TEST_IMAGES):
-        start = time.time()
+        start = time.perf_counter()
         model.predict(images[i:i+1])
-        end = time.time()
+        end = time.perf_counter()
         latencies.append((end - start) * 1000)
 
     # 测试 FPS
     print("  测试 FPS...")
-    start = time.time()
+    start = time.perf_counter()
     for i in range(0, TEST_IMAGES, 5):
         model.predict(images[i:i+5])
-    total_time = time.time() - start
+    total_time = time.perf_counter() - start
     fps = TEST_IMAGES / total_time
 
     # 计算统计